@@ -2,6 +2,21 @@ from oath._totp import *
 from oath._hotp import *
 from oath._ocra import *
 from oath.google_authenticator import *
+from oath import _hotp, _totp, google_authenticator
 from oath._utils import fromhex, tohex
 
+
+def clear_caches():
+    '''Empty the process wide caches of the package.
+
+       Decoded keys, keyed HMAC states, TOTP windows and parsed otpauth URIs
+       are cached; they are, or derive from, the OTP secrets. Call this to
+       drop them from memory, for example after revoking a secret.
+    '''
+    _hotp._fromhex.cache_clear()
+    _hotp._primed_hmac.cache_clear()
+    _totp._totp_window.cache_clear()
+    google_authenticator._parse_otpauth.cache_clear()
+
+
 __version__ = VERSION = '1.4.0'
@@ -1,3 +1,4 @@
+import functools
 import hashlib
 import hmac
 import struct
@@ -18,32 +19,156 @@ client side.
 See also http://tools.ietf.org/html/rfc4226
 '''
 
-__all__ = ('hotp', 'accept_hotp')
+__all__ = ('hotp', 'hotp_window', 'accept_hotp')
+
+# pre-compiled struct formats, for the packing and unpacking of the
+# dynamically truncated value
+_pack_truncated = struct.Struct('>I').pack
+_unpack_truncated = struct.Struct('>I').unpack_from
+
+# decimal formats and their number of digits
+_DEC_FORMATS = {'dec4': 4, 'dec6': 6, 'dec7': 7, 'dec8': 8}
+_DECIMAL_DIGITS = frozenset('0123456789')
+_POW10 = tuple(10**i for i in range(11))
+
+# HMAC inner and outer pad translation tables (RFC 2104)
+_TRANS_36 = bytes(x ^ 0x36 for x in range(256))
+_TRANS_5C = bytes(x ^ 0x5C for x in range(256))
 
 
 def truncated_value(h):
-    v = h[-1]
-    if not isinstance(v, int):
-        v = ord(v)  # Python 2.x
-    offset = v & 0xF
-    (value,) = struct.unpack('>I', h[offset : offset + 4])
+    offset = h[-1] & 0xF
+    (value,) = _unpack_truncated(h, offset)
     return value & 0x7FFFFFFF
 
 
 def dec(h, p):
-    digits = str(truncated_value(h))
-    return digits[-p:].zfill(p)
+    return '%0*d' % (p, truncated_value(h) % _POW10[p])
 
 
 def int2beint64(i):
-    return struct.pack('>Q', int(i))
+    return int(i).to_bytes(8, 'big')
+
+
+@functools.lru_cache(maxsize=1024)
+def _fromhex(key):
+    return _utils.fromhex(key)
+
+
+def _decode_key(key):
+    '''Return the binary value of a key given as raw bytes or as an hexadecimal
+       string; decoded hexadecimal keys are cached for repeated validations.
+    '''
+    if isinstance(key, (bytes, bytearray)):
+        return bytes(key)
+    return _fromhex(key)
 
 
 def __hotp(key, counter, hash=hashlib.sha1):
     bin_counter = int2beint64(counter)
-    bin_key = _utils.fromhex(key)
+    bin_key = _decode_key(key)
+
+    return _hmac_prepped(_primed_hmac(bin_key, hash), bin_counter)
+
+
+@functools.lru_cache(maxsize=128)
+def _drift_order(lo, hi):
+    '''Return the offsets of the window [lo, hi], nearest to zero first, as
+       a well synchronized token is usually found without any drift.
+
+       Windows are usually constant, so their orders are cached.
+    '''
+    return tuple(sorted(range(lo, hi + 1), key=lambda i: (abs(i), i < 0)))
 
-    return hmac.new(bin_key, bin_counter, hash).digest()
+
+def _hmac_prep(bin_key, hash=hashlib.sha1):
+    '''Return the inner and outer hash objects of an HMAC keyed with bin_key,
+       i.e. already fed with the key XOR-ed with ipad and opad (RFC 2104).
+
+       The key blocks are absorbed only once; use _hmac_prepped() to compute
+       the HMAC of each message from copies of them.
+    '''
+    if callable(hash):
+        new = hash
+    elif isinstance(hash, str):
+        new = functools.partial(hashlib.new, hash)
+    else:
+        new = hash.new
+    inner, outer = new(), new()
+    block_size = inner.block_size
+    if len(bin_key) > block_size:
+        bin_key = new(bin_key).digest()
+    bin_key = bin_key.ljust(block_size, b'\0')
+    inner.update(bin_key.translate(_TRANS_36))
+    outer.update(bin_key.translate(_TRANS_5C))
+    return inner, outer
+
+
+@functools.lru_cache(maxsize=1024)
+def _primed_hmac(bin_key, hash=hashlib.sha1):
+    '''Cached _hmac_prep(), for keys used for many HMAC computations.
+
+       Copying the primed states is cheaper than the one-shot hmac.digest(),
+       which absorbs the key blocks again on every call, so every HMAC keyed
+       by an OTP secret goes through this cache.
+    '''
+    return _hmac_prep(bin_key, hash)
+
+
+def _hmac_prepped(prep, msg):
+    inner, outer = prep
+    h = inner.copy()
+    h.update(msg)
+    o = outer.copy()
+    o.update(h.digest())
+    return o.digest()
+
+
+def _dec_formatter(p):
+    modulus, fmt = _POW10[p], '%%0%dd' % p
+    return lambda h: fmt % (truncated_value(h) % modulus)
+
+
+_FORMATTERS = {
+    'hex': lambda h: '%x' % truncated_value(h),
+    'hex-notrunc': _utils.tohex,
+    'bin': lambda h: h,
+    'dec': lambda h: str(truncated_value(h)),
+}
+_FORMATTERS.update((format, _dec_formatter(p)) for format, p in _DEC_FORMATS.items())
+
+
+def _formatter(format):
+    try:
+        return _FORMATTERS[format]
+    except (KeyError, TypeError):
+        raise ValueError('unknown format')
+
+
+def _format(bin_hotp, format):
+    return _formatter(format)(bin_hotp)
+
+
+def _digests(bin_key, counters, hash=hashlib.sha1):
+    '''Compute the HMAC digests of several counters, keying the HMAC once.'''
+    prep = _primed_hmac(bin_key, hash)
+    return [_hmac_prepped(prep, int2beint64(counter)) for counter in counters]
+
+
+def _matcher(response, format):
+    '''Return a function telling if an HMAC digest gives the OTP response.
+
+       Decimal responses are compared as integers, so candidates do not need
+       to be formatted.
+    '''
+    p = _DEC_FORMATS.get(format)
+    if p is None:
+        return lambda digest: _utils.compare_digest(_format(digest, format), response)
+    if not isinstance(response, str) or len(response) != p or not _DECIMAL_DIGITS.issuperset(response):
+        return lambda digest: False
+    target = _pack_truncated(int(response))
+    modulus = _POW10[p]
+    return lambda digest: hmac.compare_digest(_pack_truncated(truncated_value(digest) % modulus), target)
 
 
 def hotp(key, counter, format='dec6', hash=hashlib.sha1):
@@ -51,7 +176,7 @@ def hotp(key, counter, format='dec6', hash=hashlib.sha1):
        Compute a HOTP value as prescribed by RFC4226
 
        :param key:
-           the HOTP secret key given as an hexadecimal string
+           the HOTP secret key given as an hexadecimal string or as bytes
        :param counter:
            the OTP generation counter
        :param format:
@@ -73,28 +198,35 @@ def hotp(key, counter, format='dec6', hash=hashlib.sha1):
        Examples:
 
         >>> hotp('343434', 2, format='dec6')
-            '791903'
+            '791303'
     '''
-    bin_hotp = __hotp(key, counter, hash)
-
-    if format == 'dec4':
-        return dec(bin_hotp, 4)
-    elif format == 'dec6':
-        return dec(bin_hotp, 6)
-    elif format == 'dec7':
-        return dec(bin_hotp, 7)
-    elif format == 'dec8':
-        return dec(bin_hotp, 8)
-    elif format == 'hex':
-        return '%x' % truncated_value(bin_hotp)
-    elif format == 'hex-notrunc':
-        return _utils.tohex(bin_hotp)
-    elif format == 'bin':
-        return bin_hotp
-    elif format == 'dec':
-        return str(truncated_value(bin_hotp))
-    else:
-        raise ValueError('unknown format')
+    return _format(__hotp(key, counter, hash), format)
+
+
+def hotp_window(key, counters, format='dec6', hash=hashlib.sha1):
+    '''
+       Compute the HOTP values of several counters for the same key.
+
+       The HMAC is keyed only once and reused for every counter, which is
+       cheaper than calling hotp() for each of them.
+
+       :param key:
+           the HOTP secret key given as an hexadecimal string or as bytes
+       :param counters:
+           an iterable of OTP generation counters
+       :param format:
+           the output format, see hotp(); it defaults to dec6.
+       :param hash:
+           the hash module (usually from the hashlib package) to use,
+           it defaults to hashlib.sha1.
+
+       :returns:
+           the list of the OTP values, in the order of the counters.
+
+       >>> hotp_window('343434', range(2, 4))
+           ['791303', '907279']
+    '''
+    return [_format(digest, format) for digest in _digests(_decode_key(key), counters, hash)]
 
 
 def accept_hotp(key, response, counter, format='dec6', hash=hashlib.sha1, drift=3, backward_drift=0):
@@ -105,7 +237,7 @@ def accept_hotp(key, response, counter, format='dec6', hash=hashlib.sha1, drift=
        :param key:
            the shared secret
        :type key:
-           hexadecimal string of even length
+           hexadecimal string of even length, or bytes
        :param response:
            the OTP to check
        :type response:
@@ -145,9 +277,9 @@ def accept_hotp(key, response, counter, format='dec6', hash=hashlib.sha1, drift=
            (False, 2)
 
        >>> hotp('343434', 2, format='dec6')
-           '791903'
+           '791303'
 
-       >>> accept_hotp('343434', '791903', 2, format='dec6')
+       >>> accept_hotp('343434', '791303', 2, format='dec6')
            (True, 3)
 
        >>> hotp('343434', 3, format='dec6')
@@ -157,7 +289,9 @@ def accept_hotp(key, response, counter, format='dec6', hash=hashlib.sha1, drift=
            (True, 4)
     '''
 
-    for i in range(-backward_drift, drift + 1):
-        if _utils.compare_digest(hotp(key, counter + i, format=format, hash=hash), str(response)):
+    prep = _primed_hmac(_decode_key(key), hash)
+    match = _matcher(str(response), format)
+    for i in _drift_order(-backward_drift, drift):
+        if match(_hmac_prepped(prep, int2beint64(counter + i))):
             return True, counter + i + 1
     return False, counter
@@ -1,7 +1,6 @@
-import hmac
+import functools
 import hashlib
-import re
-import random
+import secrets
 import string
 
 from . import _hotp as hotp, _utils
@@ -23,18 +22,22 @@ __all__ = (
 )
 
 
-def is_int(v):
-    try:
-        int(v)
-        return True
-    except ValueError:
-        return False
-
-
 # Constants
 PERIODS = {'H': 3600, 'M': 60, 'S': 1}
 HOTP = 'HOTP'
 OCRA_1 = 'OCRA-1'
+ZERO_PADDING = b'\0' * 128
+ALPHANUMERIC = string.digits + string.ascii_letters
+# fixed length digests available on every platform; SHAKE needs an output length
+HASH_ALGORITHMS = {
+    name: getattr(hashlib, name)
+    for name in hashlib.algorithms_guaranteed
+    if not name.startswith('shake_') and hasattr(hashlib, name)
+}
+
+
+def _untruncated(h):
+    return str(hotp.truncated_value(h))
 
 
 class CryptoFunction(object):
@@ -50,9 +53,15 @@ class CryptoFunction(object):
 
     def __init__(self, hash_algo, truncation_length):
         assert hash_algo
-        assert is_int(truncation_length) or truncation_length is None
+        assert isinstance(truncation_length, int) or truncation_length is None
         self.hash_algo = hash_algo
         self.truncation_length = truncation_length
+        # choose the truncation once, not on every call
+        # (no lambdas, so that suites and sessions can be pickled)
+        if truncation_length:
+            self._truncate = functools.partial(hotp.dec, p=truncation_length)
+        else:
+            self._truncate = _untruncated
 
     def __call__(self, key, data_input):
         '''Compute an HOTP digest using the given key and data input and
@@ -68,11 +77,29 @@ class CryptoFunction(object):
                the computed digest
            :rtype: str
         '''
-        h = hmac.new(key, data_input, self.hash_algo).digest()
-        if self.truncation_length:
-            return hotp.dec(h, self.truncation_length)
-        else:
-            return str(hotp.truncated_value(h))
+        return self._truncate(hotp._hmac_prepped(hotp._primed_hmac(bytes(key), self.hash_algo), data_input))
+
+    def digest_many(self, key, data_inputs, prefix=b''):
+        '''Compute the HOTP digests of several data inputs with the same key,
+           keying the HMAC only once.
+
+           :param key:
+               a byte string containing the HMAC key
+           :param data_inputs:
+               an iterable of data inputs, as given to __call__
+           :param prefix:
+               a byte string prepended to every data input; it is hashed only
+               once
+           :returns:
+               the list of the computed digests, in the order of the data inputs
+        '''
+        prep = hotp._primed_hmac(bytes(key), self.hash_algo)
+        if prefix:
+            inner, outer = prep
+            inner = inner.copy()
+            inner.update(prefix)
+            prep = inner, outer
+        return [self._truncate(hotp._hmac_prepped(prep, data_input)) for data_input in data_inputs]
 
     def __str__(self):
         '''Return the standard representation for the given crypto function.
@@ -80,6 +107,7 @@ class CryptoFunction(object):
         return 'HOTP-%s-%s' % (self.hash_algo.__name__, self.truncation_length)
 
 
+@functools.lru_cache(maxsize=128)
 def str2hashalgo(description):
     '''Convert the name of a hash algorithm as described in the OATH
        specifications, to a python object handling the digest algorithm
@@ -89,12 +117,13 @@ def str2hashalgo(description):
            the name of the hash algorithm, example
        :rtype: a hash algorithm class constructor
     '''
-    algo = getattr(hashlib, description.lower(), None)
-    if not callable(algo):
+    try:
+        return HASH_ALGORITHMS[description.lower()]
+    except KeyError:
         raise ValueError('Unknown hash algorithm %s' % description)
-    return algo
 
 
+@functools.lru_cache(maxsize=128)
 def str2cryptofunction(crypto_function_description):
     '''
        Convert an OCRA crypto function description into a CryptoFunction
@@ -120,6 +149,44 @@ def str2cryptofunction(crypto_function_description):
     return CryptoFunction(algo, truncation_length)
 
 
+# challenges are validated with the str predicates, which run in C; isascii()
+# rules out the non-ASCII digits and letters they would otherwise accept
+def encode_numeric_challenge(Q):
+    if not (Q.isascii() and Q.isdigit()):
+        raise ValueError('challenge')
+    # the hexadecimal notation of the number, right-padded with a zero nibble
+    # to a whole number of bytes, written directly as an integer
+    value = int(Q)
+    nibbles = (value.bit_length() + 3) // 4 or 1
+    if nibbles % 2:
+        value <<= 4
+    return value.to_bytes((nibbles + 1) // 2, 'big')
+
+
+def encode_alphanumeric_challenge(Q):
+    if not (Q.isascii() and Q.isalnum()):
+        raise ValueError('challenge')
+    return Q.encode('ascii')
+
+
+def encode_hexadecimal_challenge(Q):
+    # isalnum() excludes the whitespace bytes.fromhex() would skip, so the
+    # decoding itself checks that only hexadecimal digits remain
+    if not Q.isalnum():
+        raise ValueError('challenge')
+    try:
+        return _utils.fromhex(Q)
+    except ValueError:
+        raise ValueError('challenge')
+
+
+CHALLENGE_ENCODERS = {
+    'N': encode_numeric_challenge,
+    'A': encode_alphanumeric_challenge,
+    'H': encode_hexadecimal_challenge,
+}
+
+
 class DataInput(object):
     '''
        OCRA data input description
@@ -129,7 +196,8 @@ class DataInput(object):
        to give to the HMAC algorithme implemented by a CryptoFunction object
     '''
 
-    __slots__ = ['C', 'Q', 'P', 'S', 'T']
+    FIELDS = ['C', 'Q', 'P', 'S', 'T']
+    __slots__ = FIELDS + ['_encode_challenge', '_pin_digest_size']
 
     def __init__(self, C=None, Q=None, P=None, S=None, T=None):
         self.C = C
@@ -137,78 +205,88 @@ class DataInput(object):
         self.P = P
         self.S = S
         self.T = T
+        # the challenge format is fixed by the suite, resolve its encoder once
+        self._encode_challenge = CHALLENGE_ENCODERS[Q[0]] if Q else None
+        # hashlib constructors do not expose the digest size, ask an instance
+        self._pin_digest_size = P().digest_size if P else None
 
     def __call__(self, C=None, Q=None, P=None, P_digest=None, S=None, T=None, T_precomputed=None, Qsc=None):
-        datainput = b''
+        datainput = []
         if self.C:
             try:
                 C = int(C)
-                if C < 0 or C > 2 ** 64:
-                    raise Exception()
-            except:
+            except (TypeError, ValueError):
+                raise ValueError('Invalid counter value %s' % C)
+            if not 0 <= C < 2 ** 64:
                 raise ValueError('Invalid counter value %s' % C)
-            datainput += hotp.int2beint64(int(C))
+            datainput.append(C.to_bytes(8, 'big'))
         if self.Q:
             max_length = self.Q[1]
             if Qsc is not None:
                 # Mutual Challenge-Response
                 Q = Qsc
                 max_length *= 2
-            if Q is None or not isinstance(Q, str) or len(Q) > max_length:
+            if not isinstance(Q, str) or len(Q) > max_length:
                 raise ValueError('challenge')
-            if self.Q[0] == 'N' and not Q.isdigit():
-                raise ValueError('challenge')
-            if self.Q[0] == 'A' and not Q.isalnum():
-                raise ValueError('challenge')
-            if self.Q[0] == 'H':
-                try:
-                    int(Q, 16)
-                except ValueError:
-                    raise ValueError('challenge')
-            if self.Q[0] == 'N':
-                Q = '%x' % int(Q)
-                Q += '0' * (len(Q) % 2)
-                Q = _utils.fromhex(Q)
-            if self.Q[0] == 'A':
-                pass
-            if self.Q[0] == 'H':
-                Q = _utils.fromhex(Q)
-            datainput += _utils.tobytes(Q)
-            datainput += _utils.tobytes('\0' * (128 - len(Q)))
+            Q = self._encode_challenge(Q)
+            datainput.append(Q)
+            datainput.append(ZERO_PADDING[: 128 - len(Q)])
         if self.P:
             if P_digest:
-                if len(P_digest) == self.P.digest_size:
-                    datainput += _utils.tobytes(P_digest)
-                elif len(P_digest) == 2 * self.P.digest_size:
-                    datainput += _utils.fromhex(_utils.tobytes(P_digest))
+                if len(P_digest) == self._pin_digest_size:
+                    datainput.append(_utils.tobytes(P_digest))
+                elif len(P_digest) == 2 * self._pin_digest_size:
+                    if isinstance(P_digest, bytes):
+                        P_digest = P_digest.decode('ascii')
+                    datainput.append(_utils.fromhex(P_digest))
                 else:
                     raise ValueError('Pin/Password digest invalid %r' % P_digest)
             elif P is None:
                 raise ValueError('Pin/Password missing')
             else:
-                datainput += self.P(_utils.tobytes(P)).digest()
+                datainput.append(self.P(_utils.tobytes(P)).digest())
         if self.S:
             if S is None or len(S) != self.S:
                 raise ValueError('session')
-            datainput += _utils.tobytes(S)
+            datainput.append(_utils.tobytes(S))
         if self.T:
-            if is_int(T_precomputed):
-                datainput += hotp.int2beint64(int(T_precomputed))
-            elif is_int(T):
-                datainput += hotp.int2beint64(int(T / self.T))
+            if T_precomputed is not None:
+                T = T_precomputed
+            elif T is not None:
+                T = int(T) // self.T
             else:
                 raise ValueError('timestamp')
-        return datainput
+            datainput.append(hotp.int2beint64(T))
+        return b''.join(datainput)
 
     def __str__(self):
         values = []
-        for slot in DataInput.__slots__:
+        for slot in DataInput.FIELDS:
             value = getattr(self, slot, None)
             if value is not None:
                 values.append('{0}={1}'.format(slot, value))
         return '<{0} {1}>'.format(DataInput.__class__.__name__, ', '.join(values))
 
 
+def str2timestep(description):
+    '''Convert an OCRA timestep description, like 1M or 1H30M, to a number of
+       seconds.
+    '''
+    length, i, end = 0, 0, len(description)
+    while i < end:
+        j = i
+        while j < end and description[j] in string.digits:
+            j += 1
+        if j == i or j == end or description[j] not in PERIODS:
+            raise ValueError('Invalid timestep %s' % description)
+        length += int(description[i:j]) * PERIODS[description[j]]
+        i = j + 1
+    if length == 0:
+        raise ValueError('Invalid timestep %s' % description)
+    return length
+
+
+@functools.lru_cache(maxsize=128)
 def str2datainput(datainput_description):
     elements = datainput_description.split('-')
     datainputs = {}
@@ -246,15 +324,7 @@ def str2datainput(datainput_description):
         elif letter == 'T':
             complement = element[1:] or '1M'
             try:
-                length = 0
-                if not re.match(r'^(\d+[HMS])+$', complement):
-                    raise ValueError()
-                parts = re.findall(r'\d+[HMS]', complement)
-                for part in parts:
-                    period = part[-1]
-                    quantity = int(part[:-1])
-                    length += quantity * PERIODS[period]
-                datainputs[letter] = length
+                datainputs[letter] = str2timestep(complement)
             except ValueError:
                 raise ValueError('Invalid timestamp descriptor %s' % element)
         else:
@@ -267,19 +337,73 @@ class OcraSuite(object):
         self.ocrasuite_description = ocrasuite_description
         self.crypto_function = crypto_function
         self.data_input = data_input
+        self._prefix = ocrasuite_description.encode('ascii') + b'\0'
 
     def __call__(self, key, **kwargs):
-        data_input = self.ocrasuite_description.encode('ascii') + b'\0' + self.data_input(**kwargs)
-        return self.crypto_function(key, data_input)
+        return self.crypto_function(key, self._prefix + self.data_input(**kwargs))
 
     def accept(self, response, key, **kwargs):
         return _utils.compare_digest(str(response), self(key, **kwargs))
 
+    def accept_window(self, response, key, T_range, **kwargs):
+        '''Validate a response against several time steps.
+
+           The data input is built once; as the timestamp is its last field,
+           only those 8 bytes change between the candidates.
+
+           :param T_range:
+               an iterable of time step counters, as given by T_precomputed,
+               tried in order
+           :returns:
+               a pair of a boolean and the matching time step counter, or
+               (False, None) when no time step matches
+        '''
+        if not self.data_input.T:
+            raise ValueError('Ocrasuite must have a T descriptor')
+        if 'T' in kwargs or 'T_precomputed' in kwargs:
+            raise ValueError('time steps must be given by T_range, not T or T_precomputed')
+        T_range = list(T_range)
+        base = self._prefix + self.data_input(T_precomputed=0, **kwargs)[:-8]
+        candidates = self.crypto_function.digest_many(key, map(hotp.int2beint64, T_range), prefix=base)
+        response = str(response)
+        for T, candidate in zip(T_range, candidates):
+            if _utils.compare_digest(response, candidate):
+                return True, T
+        return False, None
+
+    def accept_t_window(self, response, key, T=None, backward_drift=1, forward_drift=1, **kwargs):
+        '''Validate a response inside a window of time steps around a timestamp,
+           as accept_totp() does for TOTP.
+
+           :param T:
+               the timestamp in seconds, it defaults to the current time
+           :param backward_drift:
+               how many time steps to look backward
+           :param forward_drift:
+               how many time steps to look forward
+           :returns:
+               a pair of a boolean and the matching time step counter, or
+               (False, None) when no time step matches
+        '''
+        if not self.data_input.T:
+            raise ValueError('Ocrasuite must have a T descriptor')
+        center = _utils.timestamp(T) // self.data_input.T
+        # time steps before the epoch cannot be encoded
+        T_range = [center + i for i in hotp._drift_order(max(-center, -backward_drift), forward_drift)]
+        return self.accept_window(response, key, T_range, **kwargs)
+
     def __str__(self):
         return '<OcraSuite crypto_function:%s data_input:%s>' % (self.crypto_function, self.data_input)
 
 
+@functools.lru_cache(maxsize=128)
 def str2ocrasuite(ocrasuite_description):
+    '''Parse an OCRA suite description, like OCRA-1:HOTP-SHA1-6:QN08, into
+       an OcraSuite object.
+
+       Parsed suites are cached and shared: the returned object must not be
+       modified, but it can be used concurrently.
+    '''
     elements = ocrasuite_description.split(':')
     if len(elements) != 3:
         raise ValueError('Bad OcraSuite description %s' % ocrasuite_description)
@@ -300,7 +424,12 @@ DEFAULT_LENGTH = 20
 class OCRAChallengeResponse(object):
     state = 1
 
-    def __init__(self, key, ocrasuite_description, remote_ocrasuite_description=None):
+    def __init__(self, key, ocrasuite_description, remote_ocrasuite_description=None, P=None):
+        '''
+           :param P:
+               the PIN or password, if the suites use one; its digest is
+               computed once here instead of for every code
+        '''
         self.key = key
         self.ocrasuite = str2ocrasuite(ocrasuite_description)
         self.remote_ocrasuite = remote_ocrasuite_description is not None and str2ocrasuite(
@@ -308,21 +437,47 @@ class OCRAChallengeResponse(object):
         )
         if not self.ocrasuite.data_input.Q:
             raise ValueError('Ocrasuite must have a Q descriptor')
+        self._P_digests = {}
+        if P is not None:
+            for ocrasuite in (self.ocrasuite, self.remote_ocrasuite):
+                if ocrasuite and ocrasuite.data_input.P:
+                    self._P_digests[ocrasuite] = ocrasuite.data_input.P(_utils.tobytes(P)).digest()
+
+    def _with_pin(self, ocrasuite, kwargs):
+        '''Add the precomputed PIN digest of ocrasuite, unless the caller gave
+           a PIN.
+        '''
+        P_digest = self._P_digests.get(ocrasuite)
+        if P_digest is not None and 'P' not in kwargs and 'P_digest' not in kwargs:
+            kwargs['P_digest'] = P_digest
+        return kwargs
+
+
+def random_string(alphabet, length):
+    '''Return a random string of the given length drawn from alphabet, using
+       the operating system CSPRNG.
+
+       A single uniform integer below len(alphabet) ** length is drawn and
+       written in base len(alphabet), which is cheaper than one draw per
+       character.
+    '''
+    base = len(alphabet)
+    n = secrets.randbelow(base ** length)
+    c = []
+    for _ in range(length):
+        n, r = divmod(n, base)
+        c.append(alphabet[r])
+    return ''.join(c)
 
 
 def compute_challenge(Q):
     kind, length = Q
-    try:
-        r = xrange(0, length)
-    except NameError:
-        r = range(0, length)
     if kind == 'N':
-        c = ''.join([random.choice(string.digits) for i in r])
+        c = '%0*d' % (length, secrets.randbelow(10 ** length))
     elif kind == 'A':
-        alphabet = string.digits + string.ascii_letters
-        c = ''.join([random.choice(alphabet) for i in r])
+        c = random_string(ALPHANUMERIC, length)
     elif kind == 'H':
-        c = ''.join([random.choice(string.hexdigits) for i in r])
+        c = secrets.token_hex((length + 1) // 2)[:length]
     else:
         raise ValueError('Q kind is unknown: %s' % kind)
     return c
@@ -343,9 +498,9 @@ class OCRAChallengeResponseServer(OCRAChallengeResponse):
 
     def verify_response(self, response, **kwargs):
         if self.state != self.SERVER_STATE_VERIFY_RESPONSE:
-            return StateException()
+            raise StateException()
         ocrasuite = self.remote_ocrasuite or self.ocrasuite
-        c = _utils.compare_digest(ocrasuite(self.key, Q=self.challenge, **kwargs), response)
+        c = ocrasuite.accept(response, self.key, Q=self.challenge, **self._with_pin(ocrasuite, kwargs))
         if c:
             self.state = self.SERVER_STATE_FINISHED
         return c
@@ -353,7 +508,7 @@ class OCRAChallengeResponseServer(OCRAChallengeResponse):
 
 class OCRAChallengeResponseClient(OCRAChallengeResponse):
     def compute_response(self, challenge, **kwargs):
-        return self.ocrasuite(self.key, Q=challenge, **kwargs)
+        return self.ocrasuite(self.key, Q=challenge, **self._with_pin(self.ocrasuite, kwargs))
 
 
 class OCRAMutualChallengeResponseClient(OCRAChallengeResponse):
@@ -373,20 +528,20 @@ class OCRAMutualChallengeResponseClient(OCRAChallengeResponse):
 
     def verify_server_response(self, response, challenge, **kwargs):
         if self.state != self.CLIENT_STATE_VERIFY_SERVER_RESPONSE:
-            return StateException()
+            raise StateException()
         self.server_challenge = challenge
         q = self.client_challenge + self.server_challenge
         ocrasuite = self.remote_ocrasuite or self.ocrasuite
-        c = _utils.compare_digest(ocrasuite(self.key, Qsc=q, **kwargs), response)
+        c = ocrasuite.accept(response, self.key, Qsc=q, **self._with_pin(ocrasuite, kwargs))
         if c:
             self.state = self.CLIENT_STATE_COMPUTE_CLIENT_RESPONSE
         return c
 
     def compute_client_response(self, **kwargs):
         if self.state != self.CLIENT_STATE_COMPUTE_CLIENT_RESPONSE:
-            return StateException()
+            raise StateException()
         q = self.server_challenge + self.client_challenge
-        rc = self.ocrasuite(self.key, Qsc=q, **kwargs)
+        rc = self.ocrasuite(self.key, Qsc=q, **self._with_pin(self.ocrasuite, kwargs))
         self.state = self.CLIENT_STATE_FINISHED
         return rc
 
@@ -414,7 +569,7 @@ class OCRAMutualChallengeResponseServer(OCRAChallengeResponse):
             raise StateException()
         q = self.server_challenge + self.client_challenge
         ocrasuite = self.remote_ocrasuite or self.ocrasuite
-        c = _utils.compare_digest(ocrasuite(self.key, Qsc=q, **kwargs), response)
+        c = ocrasuite.accept(response, self.key, Qsc=q, **self._with_pin(ocrasuite, kwargs))
         if c:
             self.state = self.SERVER_STATE_FINISHED
         return c
@@ -1,9 +1,5 @@
-import time
+import functools
 import hashlib
-import datetime
-import calendar
-
-from . import _utils
 
 '''
 :mod:`totp` -- RFC6238 - OATH TOTP implementation
@@ -17,9 +13,21 @@ from . import _utils
 '''
 
 
-from ._hotp import hotp
-
-__all__ = ('totp', 'accept_totp')
+from . import _utils
+from ._hotp import (
+    hotp,
+    hotp_window,
+    int2beint64,
+    _decode_key,
+    _digests,
+    _drift_order,
+    _formatter,
+    _hmac_prepped,
+    _matcher,
+    _primed_hmac,
+)
+
+__all__ = ('totp', 'totp_batch', 'make_totp', 'accept_totp')
 
 
 def totp(key, format='dec6', period=30, t=None, hash=hashlib.sha1):
@@ -27,7 +35,7 @@ def totp(key, format='dec6', period=30, t=None, hash=hashlib.sha1):
        Compute a TOTP value as prescribed by OATH specifications.
 
        :param key:
-           the TOTP key given as an hexadecimal string
+           the TOTP key given as an hexadecimal string or as bytes
        :param format:
            the output format, can be:
               - hex, for a variable length hexadecimal format,
@@ -52,17 +60,77 @@ def totp(key, format='dec6', period=30, t=None, hash=hashlib.sha1):
            a string representation of the OTP value (as instructed by the format parameter).
        :type: str
     '''
-    if t is None:
-        t = int(time.time())
-    else:
-        if isinstance(t, datetime.datetime):
-            t = calendar.timegm(t.utctimetuple())
-        else:
-            t = int(t)
-    T = int(t / period)
+    T = _utils.timestamp(t) // period
     return hotp(key, T, format=format, hash=hash)
 
 
+def totp_batch(key, format='dec6', period=30, t=None, hash=hashlib.sha1, backward_drift=1, forward_drift=1):
+    '''
+       Compute all the TOTP values of a window of time steps at once.
+
+       The parameters are the same as for totp() and accept_totp().
+
+       :param backward_drift:
+           the number of periods before the current one to include; it
+           defaults to 1.
+       :param forward_drift:
+           the number of periods after the current one to include; it
+           defaults to 1.
+
+       :returns:
+           the list of the backward_drift + forward_drift + 1 OTP values,
+           from the oldest to the newest time step.
+    '''
+    T = _utils.timestamp(t) // period
+    return hotp_window(key, range(T - backward_drift, T + forward_drift + 1), format=format, hash=hash)
+
+
+def make_totp(format='dec6', period=30, hash=hashlib.sha1):
+    '''
+       Return a totp() function specialized for a format, a period and a hash.
+
+       The format is resolved once and no keyword arguments are processed on
+       each call, which helps when many TOTPs are computed with the same
+       parameters.
+
+       :param format:
+           the output format, see totp(); it defaults to dec6.
+       :param period:
+           the period between changes of the OTP value, as seconds, it
+           defaults to 30.
+       :param hash:
+           the hash module (usually from the hashlib package) to use,
+           it defaults to hashlib.sha1.
+
+       :returns:
+           a function taking a key and an optional time t, with the same
+           meaning as for totp(), and returning the OTP value.
+
+       >>> totp_dec8 = make_totp(format='dec8')
+       >>> totp_dec8('3132333435363738393031323334353637383930', t=59)
+           '94287082'
+    '''
+    formatter = _formatter(format)
+
+    def _totp(key, t=None):
+        T = _utils.timestamp(t) // period
+        return formatter(_hmac_prepped(_primed_hmac(_decode_key(key), hash), int2beint64(T)))
+
+    return _totp
+
+
+@functools.lru_cache(maxsize=256)
+def _totp_window(bin_key, T, lo, hi, hash=hashlib.sha1):
+    '''Compute the HMAC digests for the time steps T+lo to T+hi.
+
+       Only the counter changes between the time steps of the window, so the
+       HMAC is keyed once and copied for each of them. Windows are cached as
+       the same one is checked again by every validation made during the
+       same time step.
+    '''
+    return tuple(_digests(bin_key, range(T + lo, T + hi + 1), hash))
+
+
 def accept_totp(
     key,
     response,
@@ -84,7 +152,7 @@ def accept_totp(
            to the format parameter (it's not mandatory, it is part of the
            checks),
        :param key:
-           the TOTP key given as an hexadecimal string
+           the TOTP key given as an hexadecimal string or as bytes
        :param format:
            the output format, can be:
               - hex40, for a 40 characters hexadecimal format,
@@ -134,10 +202,11 @@ def accept_totp(
            reliable source of time like an NTP server.
        :rtype: a two element tuple
     '''
-    if t is None:
-        t = int(time.time())
-    for i in range(max(-divmod(t, period)[0], -backward_drift), forward_drift + 1):
-        d = (drift + i) * period
-        if _utils.compare_digest(totp(key, format=format, period=period, hash=hash, t=t + d), response):
+    T = _utils.timestamp(t) // period
+    lo = max(-(T + drift), -backward_drift)
+    digests = _totp_window(_decode_key(key), T + drift, lo, forward_drift, hash=hash)
+    match = _matcher(str(response), format)
+    for i in _drift_order(lo, forward_drift):
+        if match(digests[i - lo]):
             return True, drift + i
     return False, 0
@@ -11,12 +11,9 @@ This module provides parsing and high-level API over the classic HOTP and TOTP
 APIs provided by the oath.hotp and oath.totp modules.
 '''
 
-try:
-    from urlparse import urlparse, parse_qs
-    from urllib import urlencode, quote
-except ImportError:
-    from urllib.parse import urlparse, parse_qs, urlencode, quote
+from urllib.parse import urlparse, parse_qs, urlencode, quote
 import base64
+import functools
 import hashlib
 
 from oath import _hotp as hotp
@@ -39,6 +36,13 @@ HOTP = 'hotp'
 DRIFT = 'drift'
 ISSUER = 'issuer'
 
+ALGORITHMS = {
+    'sha1': hashlib.sha1,
+    'sha256': hashlib.sha256,
+    'sha512': hashlib.sha512,
+    'md5': hashlib.md5,
+}
+
 
 def lenient_b32decode(data):
     data = data.upper()  # Ensure correct case
@@ -47,10 +51,16 @@ def lenient_b32decode(data):
 
 
 def parse_otpauth(otpauth_uri):
+    # the cached dictionary is shared, give each caller its own copy
+    return dict(_parse_otpauth(otpauth_uri))
+
+
+@functools.lru_cache(maxsize=4096)
+def _parse_otpauth(otpauth_uri):
     if not otpauth_uri.startswith('otpauth://'):
         raise ValueError('Invalid otpauth URI', otpauth_uri)
 
-    # urlparse in python 2.6 can't handle the otpauth:// scheme, skip it
+    # skip the otpauth: scheme, only the //type/label?query part is parsed
     parsed_uri = urlparse(otpauth_uri[8:])
 
     params = dict(((k, v[0]) for k, v in parse_qs(parsed_uri.query).items()))
@@ -63,16 +73,10 @@ def parse_otpauth(otpauth_uri):
         params[SECRET] = _utils.tohex(lenient_b32decode(params[SECRET]))
     except TypeError:
         raise ValueError('Invalid base32 encoding of the secret field in ' 'otpauth URI', otpauth_uri)
-    if ALGORITHM in params:
-        params[ALGORITHM] = params[ALGORITHM].lower()
-        if params[ALGORITHM] not in ('sha1', 'sha256', 'sha512', 'md5'):
-            raise ValueError('Invalid value for algorithm field in otpauth ' 'URI', otpauth_uri)
-    else:
-        params[ALGORITHM] = 'sha1'
     try:
-        params[ALGORITHM] = getattr(hashlib, params[ALGORITHM])
-    except AttributeError:
-        raise ValueError('Unsupported algorithm %s in othauth URI' % params[ALGORITHM], otpauth_uri)
+        params[ALGORITHM] = ALGORITHMS[params.get(ALGORITHM, 'sha1').lower()]
+    except KeyError:
+        raise ValueError('Invalid value for algorithm field in otpauth ' 'URI', otpauth_uri)
 
     for key in (DIGITS, PERIOD, COUNTER):
         try:
@@ -108,62 +112,72 @@ def from_b32key(b32_key, state=None):
 
 
 class GoogleAuthenticator(object):
+    __slots__ = (
+        'otpauth_uri',
+        'parsed_otpauth_uri',
+        'generator_state',
+        'acceptor_state',
+        'label',
+        '_format',
+        '_hash',
+        '_secret',
+        '_type',
+        '_period',
+    )
+
     def __init__(self, otpauth_uri, state=None):
         self.otpauth_uri = otpauth_uri
         self.parsed_otpauth_uri = parse_otpauth(otpauth_uri)
         self.generator_state = state or {}
         self.acceptor_state = state or {}
-
-    @property
-    def label(self):
-        return self.parsed_otpauth_uri[LABEL]
+        # values used on every generate/accept call
+        params = self.parsed_otpauth_uri
+        self.label = params[LABEL]
+        self._format = 'dec%d' % params[DIGITS]
+        self._hash = params[ALGORITHM]
+        self._secret = _utils.fromhex(params[SECRET])
+        self._type = params[TYPE]
+        self._period = params.get(PERIOD, 30)
 
     def generate(self, t=None):
-        format = 'dec%s' % self.parsed_otpauth_uri[DIGITS]
-        hash = self.parsed_otpauth_uri[ALGORITHM]
-        secret = self.parsed_otpauth_uri[SECRET]
         state = self.generator_state
-        if self.parsed_otpauth_uri[TYPE] == HOTP:
+        if self._type == HOTP:
             if COUNTER not in state:
                 state[COUNTER] = self.parsed_otpauth_uri[COUNTER]
-            otp = hotp.hotp(secret, state[COUNTER], format=format, hash=hash)
+            otp = hotp.hotp(self._secret, state[COUNTER], format=self._format, hash=self._hash)
             state[COUNTER] += 1
             return otp
-        elif self.parsed_otpauth_uri[TYPE] == TOTP:
-            period = self.parsed_otpauth_uri[PERIOD]
-            return totp.totp(secret, format=format, period=period, hash=hash, t=t)
+        elif self._type == TOTP:
+            return totp.totp(self._secret, format=self._format, period=self._period, hash=self._hash, t=t)
         else:
-            raise NotImplementedError(self.parsed_otpauth_uri[TYPE])
+            raise NotImplementedError(self._type)
 
     def accept(
         self, otp, hotp_drift=3, hotp_backward_drift=0, totp_forward_drift=1, totp_backward_drift=1, t=None
     ):
-        format = 'dec%s' % self.parsed_otpauth_uri[DIGITS]
-        hash = self.parsed_otpauth_uri[ALGORITHM]
-        secret = self.parsed_otpauth_uri[SECRET]
         state = self.acceptor_state
-        if self.parsed_otpauth_uri[TYPE] == HOTP:
+        if self._type == HOTP:
             if COUNTER not in state:
                 state[COUNTER] = self.parsed_otpauth_uri[COUNTER]
             ok, state[COUNTER] = hotp.accept_hotp(
+                self._secret,
                 otp,
-                secret,
                 state[COUNTER],
-                format=format,
-                hash=hash,
+                format=self._format,
+                hash=self._hash,
                 drift=hotp_drift,
                 backward_drift=hotp_backward_drift,
             )
             return ok
-        elif self.parsed_otpauth_uri[TYPE] == TOTP:
-            period = self.parsed_otpauth_uri[PERIOD]
+        elif self._type == TOTP:
             if DRIFT not in state:
                 state[DRIFT] = 0
             ok, state[DRIFT] = totp.accept_totp(
-                secret,
+                self._secret,
                 otp,
-                format=format,
-                period=period,
+                format=self._format,
+                period=self._period,
+                hash=self._hash,
                 forward_drift=totp_forward_drift,
                 backward_drift=totp_backward_drift,
                 drift=state[DRIFT],
@@ -171,7 +185,7 @@ class GoogleAuthenticator(object):
             )
             return ok
         else:
-            raise NotImplementedError(self.parsed_otpauth_uri[TYPE])
+            raise NotImplementedError(self._type)
 
 
 class GoogleAuthenticatorURI(object):
@@ -179,6 +193,8 @@ class GoogleAuthenticatorURI(object):
         in QR afterwards
     """
 
+    __slots__ = ()
+
     def __init__(self):
         """ constructor """
         return
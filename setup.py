@@ -11,6 +11,7 @@ setup(
     author='Benjamin Dauvergne',
     author_email='bdauvergne@entrouvert.com',
     packages=['oath'],
+    python_requires='>=3.7',
     test_suite='tests',
     classifiers=[
         "Development Status :: 5 - Production/Stable",
@@ -18,8 +19,8 @@ setup(
         "License :: OSI Approved :: MIT License",
         "Operating System :: OS Independent",
         "Programming Language :: Python",
-        "Programming Language :: Python :: 2",
         "Programming Language :: Python :: 3",
+        "Programming Language :: Python :: 3 :: Only",
         "Topic :: Security",
         "Topic :: Security :: Cryptography",
     ],
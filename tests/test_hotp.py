@@ -1,6 +1,6 @@
 import unittest
 
-from oath import hotp, accept_hotp
+from oath import _hotp, accept_hotp, clear_caches, hotp, hotp_window
 
 
 class Hotp(unittest.TestCase):
@@ -51,3 +51,30 @@ class Hotp(unittest.TestCase):
         h = hotp("fb9cda921c82d893d9cdc6d6559997b1", "132974666", "dec8")
         assert len(h) == 8, 'wrong length %s' % h
         assert h == '03562487'
+
+    def test_bytes_key(self):
+        bin_secret = bytes.fromhex(self.secret)
+        for counter in range(10):
+            self.assertEqual(hotp(bin_secret, counter), hotp(self.secret, counter))
+        self.assertEqual(accept_hotp(bin_secret, hotp(self.secret, 4), 2), (True, 5))
+
+    def test_accept_hotp_dec_length(self):
+        self.assertEqual(accept_hotp(self.secret, '0755224', 0), (False, 0))
+        self.assertEqual(accept_hotp(self.secret, '55224', 0), (False, 0))
+        self.assertEqual(accept_hotp(self.secret, '-55224', 0), (False, 0))
+        self.assertEqual(accept_hotp(self.secret, '03562487', 2, format='dec8'), (False, 2))
+        self.assertEqual(accept_hotp(self.secret, 755224, 0), (True, 1))
+
+    def test_accept_hotp_backward_drift(self):
+        self.assertEqual(accept_hotp(self.secret, hotp(self.secret, 3), 5, backward_drift=2), (True, 4))
+        self.assertEqual(accept_hotp(self.secret, hotp(self.secret, 2), 5, backward_drift=2), (False, 5))
+
+    def test_hotp_window(self):
+        self.assertEqual(hotp_window(self.secret, range(10)), [hotp(self.secret, counter) for counter in range(10)])
+
+    def test_clear_caches(self):
+        accept_hotp(self.secret, '755224', 0)
+        clear_caches()
+        self.assertEqual(_hotp._fromhex.cache_info().currsize, 0)
+        self.assertEqual(_hotp._primed_hmac.cache_info().currsize, 0)
+        self.assertEqual(hotp(self.secret, 0), '755224')
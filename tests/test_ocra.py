@@ -1,6 +1,14 @@
+import pickle
 import unittest
 
-from oath import str2ocrasuite, OCRAMutualChallengeResponseClient, OCRAMutualChallengeResponseServer
+from oath import str2ocrasuite, OCRAMutualChallengeResponseClient, OCRAMutualChallengeResponseServer, StateException
+from oath._ocra import (
+    ALPHANUMERIC,
+    OCRAChallengeResponseClient,
+    OCRAChallengeResponseServer,
+    compute_challenge,
+    encode_numeric_challenge,
+)
 from oath._utils import fromhex
 
 
@@ -198,3 +206,152 @@ class OCRA(unittest.TestCase):
         self.assertTrue(ocra_client.verify_server_response(rs, qs))
         rc = ocra_client.compute_client_response()
         self.assertTrue(ocra_server.verify_client_response(rc))
+
+    def test_timestep(self):
+        self.assertEqual(str2ocrasuite('OCRA-1:HOTP-SHA1-6:QN08-T').data_input.T, 60)
+        self.assertEqual(str2ocrasuite('OCRA-1:HOTP-SHA1-6:QN08-T1H30S').data_input.T, 3630)
+        for descriptor in ('T0M', 'T1', 'T1X', 'TM', 'T1M2'):
+            with self.assertRaises(ValueError):
+                str2ocrasuite('OCRA-1:HOTP-SHA1-6:QN08-' + descriptor)
+
+    def test_str2ocrasuite_cache(self):
+        self.assertIs(str2ocrasuite(self.mut_suite), str2ocrasuite(self.mut_suite))
+
+    def test_invalid_challenge(self):
+        for suite, challenge in (
+            ('OCRA-1:HOTP-SHA1-6:QN08', '1234567a'),
+            ('OCRA-1:HOTP-SHA1-6:QN08', '١٢٣٤'),
+            ('OCRA-1:HOTP-SHA1-6:QA08', 'abc-1234'),
+            ('OCRA-1:HOTP-SHA1-6:QA08', 'abcdé'),
+            ('OCRA-1:HOTP-SHA1-6:QH08', 'ab cd'),
+            ('OCRA-1:HOTP-SHA1-6:QH08', 'abcdefgh'),
+        ):
+            with self.assertRaises(ValueError):
+                str2ocrasuite(suite)(self.key20, Q=challenge)
+
+    def test_encode_numeric_challenge(self):
+        for challenge, encoded in (('0', '00'), ('15', 'f0'), ('16', '10'), ('256', '1000'), ('4095', 'fff0')):
+            self.assertEqual(encode_numeric_challenge(challenge), fromhex(encoded))
+
+    def test_invalid_counter(self):
+        ocrasuite = str2ocrasuite('OCRA-1:HOTP-SHA512-8:C-QN08')
+        for counter in (None, 'x', -1, 2**64):
+            with self.assertRaises(ValueError):
+                ocrasuite(self.key64, C=counter, Q='12345678')
+
+    def test_digest_many(self):
+        crypto_function = str2ocrasuite('OCRA-1:HOTP-SHA512-8:QN08-T1M').crypto_function
+        data_inputs = [b'a', b'b']
+        self.assertEqual(
+            crypto_function.digest_many(self.key64, data_inputs),
+            [crypto_function(self.key64, data_input) for data_input in data_inputs],
+        )
+
+    def test_accept_window(self):
+        ocrasuite = str2ocrasuite('OCRA-1:HOTP-SHA512-8:QN08-T1M')
+        T = int('132d0b6', 16)
+        self.assertEqual(ocrasuite.accept_window('55907591', self.key64, range(T - 2, T + 3), Q='11111111'), (True, T))
+        self.assertEqual(
+            ocrasuite.accept_window('55907591', self.key64, range(T + 1, T + 3), Q='11111111'), (False, None)
+        )
+        with self.assertRaises(ValueError):
+            str2ocrasuite(self.mut_suite).accept_window('28247970', self.key32, range(3), Q='CLI22220')
+        with self.assertRaises(ValueError):
+            ocrasuite.accept_window('55907591', self.key64, range(T - 2, T + 3), Q='11111111', T=0)
+        with self.assertRaises(ValueError):
+            ocrasuite.accept_window('55907591', self.key64, range(T - 2, T + 3), Q='11111111', T_precomputed=T)
+
+    def test_timestamp(self):
+        ocrasuite = str2ocrasuite('OCRA-1:HOTP-SHA512-8:QN08-T1M')
+        T = int('132d0b6', 16)
+        self.assertEqual(ocrasuite(self.key64, Q='00000000', T=T * 60 + 59), '95209754')
+        with self.assertRaises(ValueError):
+            ocrasuite(self.key64, Q='00000000')
+
+    def test_accept_t_window(self):
+        ocrasuite = str2ocrasuite('OCRA-1:HOTP-SHA512-8:QN08-T1M')
+        T = int('132d0b6', 16)
+        self.assertEqual(ocrasuite.accept_t_window('55907591', self.key64, T=T * 60, Q='11111111'), (True, T))
+        self.assertEqual(ocrasuite.accept_t_window('55907591', self.key64, T=(T + 1) * 60, Q='11111111'), (True, T))
+        self.assertEqual(
+            ocrasuite.accept_t_window('55907591', self.key64, T=(T + 2) * 60, Q='11111111'), (False, None)
+        )
+        response = ocrasuite(self.key64, Q='11111111', T_precomputed=0)
+        self.assertEqual(ocrasuite.accept_t_window(response, self.key64, T=30, Q='11111111'), (True, 0))
+
+    def test_pin_digest(self):
+        ocrasuite = str2ocrasuite('OCRA-1:HOTP-SHA256-8:QN08-PSHA1')
+        for P_digest in (self.pin_sha1, self.pin_sha1.hex(), self.pin_sha1.hex().encode()):
+            self.assertEqual(ocrasuite(self.key32, Q='00000000', P_digest=P_digest), '83238735')
+        with self.assertRaises(ValueError):
+            ocrasuite(self.key32, Q='00000000', P_digest=self.pin_sha1[:-1])
+
+    def test_unknown_hash_algorithm(self):
+        for algorithm in ('NEW', 'FILE_DIGEST', 'SHAKE_128', 'SHA0'):
+            with self.assertRaises(ValueError):
+                str2ocrasuite('OCRA-1:HOTP-%s-6:QN08' % algorithm)
+
+    def test_compute_challenge(self):
+        for kind, alphabet in (('N', '0123456789'), ('A', ALPHANUMERIC), ('H', '0123456789abcdef')):
+            for length in (4, 8, 64):
+                challenge = compute_challenge((kind, length))
+                self.assertEqual(len(challenge), length)
+                self.assertTrue(set(challenge) <= set(alphabet))
+
+    def test_challenge_response(self):
+        ocra_client = OCRAChallengeResponseClient(self.key32, self.mut_suite)
+        ocra_server = OCRAChallengeResponseServer(self.key32, self.mut_suite)
+        challenge = ocra_server.compute_challenge()
+        response = ocra_client.compute_response(challenge)
+        self.assertFalse(ocra_server.verify_response('0' * 8 if response != '0' * 8 else '1' * 8))
+        self.assertTrue(ocra_server.verify_response(response))
+
+    def test_mutual_challenge_response_pin(self):
+        test = self.mut_tests[1]
+        server_instance = test['challenges'][0]
+        Q = server_instance['params']['Q']
+        for pickled in (False, True):
+            with self.subTest(pickled=pickled):
+                ocra_client = OCRAMutualChallengeResponseClient(
+                    test['key'], test['client_ocrasuite'], test['server_ocrasuite'], P=self.pin
+                )
+                ocra_server = OCRAMutualChallengeResponseServer(
+                    test['key'], test['server_ocrasuite'], test['client_ocrasuite'], P=self.pin
+                )
+                ocra_client.compute_client_challenge(Qc=Q[:8])
+                rs, qs = ocra_server.compute_server_response(Q[:8], Qs=Q[8:])
+                if pickled:
+                    ocra_client = pickle.loads(pickle.dumps(ocra_client))
+                    ocra_server = pickle.loads(pickle.dumps(ocra_server))
+                    # the PIN digests are still found for the unpickled suites
+                    self.assertIn(ocra_client.ocrasuite, ocra_client._P_digests)
+                    self.assertIn(ocra_server.remote_ocrasuite, ocra_server._P_digests)
+                self.assertTrue(ocra_client.verify_server_response(rs, qs))
+                rc = ocra_client.compute_client_response()
+                self.assertEqual(rc, server_instance['client_result'])
+                self.assertTrue(ocra_server.verify_client_response(rc))
+
+    def test_challenge_response_state(self):
+        ocra_server = OCRAChallengeResponseServer(self.key32, self.mut_suite)
+        with self.assertRaises(StateException):
+            ocra_server.verify_response('12345678')
+        ocra_client = OCRAMutualChallengeResponseClient(self.key32, self.mut_suite)
+        with self.assertRaises(StateException):
+            ocra_client.verify_server_response('12345678', 'SRV11110')
+        with self.assertRaises(StateException):
+            ocra_client.compute_client_response()
+
+    def test_pickle(self):
+        ocrasuite = str2ocrasuite('OCRA-1:HOTP-SHA256-8:QN08')
+        self.assertEqual(
+            pickle.loads(pickle.dumps(ocrasuite))(self.key32, Q='00000000'),
+            ocrasuite(self.key32, Q='00000000'),
+        )
+        ocrasuite = str2ocrasuite('OCRA-1:HOTP-SHA1-6:QN08')
+        self.assertEqual(pickle.loads(pickle.dumps(ocrasuite))(self.key20, Q='00000000'), '237653')
+
+        ocra_server = OCRAChallengeResponseServer(self.key32, self.mut_suite)
+        challenge = ocra_server.compute_challenge()
+        ocra_server = pickle.loads(pickle.dumps(ocra_server))
+        response = OCRAChallengeResponseClient(self.key32, self.mut_suite).compute_response(challenge)
+        self.assertTrue(ocra_server.verify_response(response))
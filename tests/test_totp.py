@@ -1,59 +1,45 @@
 import unittest
-import binascii
+import datetime
 import hashlib
+from typing import NamedTuple
 
-from oath import accept_totp
+from oath import _totp, accept_totp, clear_caches, make_totp, totp, totp_batch
 
 
-def parse_tv(tv):
-    test_vectors = [[cell.strip() for cell in line.strip(' |').split('|')] for line in tv.splitlines()]
-    test_vectors = [line for line in test_vectors if line[0] and len(line) > 3]
-    return test_vectors
+class Vector(NamedTuple):
+    t: int
+    utc: str
+    T: str
+    response: str
+    algo: str
 
 
 class Totp(unittest.TestCase):
-    key_seed = '1234567890'.encode('ascii')  # no effect in Python 2.x but makes a bytes instance in Python 3.x
-    key_sha1 = binascii.hexlify(key_seed * 2).decode('ascii')
-    key_sha256 = binascii.hexlify(key_seed * 3 + '12'.encode('ascii')).decode('ascii')
-    key_sha512 = binascii.hexlify(key_seed * 6 + '1234'.encode('ascii')).decode('ascii')
-
-    tv = parse_tv(
-        '''|      59     |  1970-01-01  | 0000000000000001 | 94287082 |  SHA1  |
-   |             |   00:00:59   |                  |          |        |
-   |      59     |  1970-01-01  | 0000000000000001 | 46119246 | SHA256 |
-   |             |   00:00:59   |                  |          |        |
-   |      59     |  1970-01-01  | 0000000000000001 | 90693936 | SHA512 |
-   |             |   00:00:59   |                  |          |        |
-   |  1111111109 |  2005-03-18  | 00000000023523EC | 07081804 |  SHA1  |
-   |             |   01:58:29   |                  |          |        |
-   |  1111111109 |  2005-03-18  | 00000000023523EC | 68084774 | SHA256 |
-   |             |   01:58:29   |                  |          |        |
-   |  1111111109 |  2005-03-18  | 00000000023523EC | 25091201 | SHA512 |
-   |             |   01:58:29   |                  |          |        |
-   |  1111111111 |  2005-03-18  | 00000000023523ED | 14050471 |  SHA1  |
-   |             |   01:58:31   |                  |          |        |
-   |  1111111111 |  2005-03-18  | 00000000023523ED | 67062674 | SHA256 |
-   |             |   01:58:31   |                  |          |        |
-   |  1111111111 |  2005-03-18  | 00000000023523ED | 99943326 | SHA512 |
-   |             |   01:58:31   |                  |          |        |
-   |  1234567890 |  2009-02-13  | 000000000273EF07 | 89005924 |  SHA1  |
-   |             |   23:31:30   |                  |          |        |
-   |  1234567890 |  2009-02-13  | 000000000273EF07 | 91819424 | SHA256 |
-   |             |   23:31:30   |                  |          |        |
-   |  1234567890 |  2009-02-13  | 000000000273EF07 | 93441116 | SHA512 |
-   |             |   23:31:30   |                  |          |        |
-   |  2000000000 |  2033-05-18  | 0000000003F940AA | 69279037 |  SHA1  |
-   |             |   03:33:20   |                  |          |        |
-   |  2000000000 |  2033-05-18  | 0000000003F940AA | 90698825 | SHA256 |
-   |             |   03:33:20   |                  |          |        |
-   |  2000000000 |  2033-05-18  | 0000000003F940AA | 38618901 | SHA512 |
-   |             |   03:33:20   |                  |          |        |
-   | 20000000000 |  2603-10-11  | 0000000027BC86AA | 65353130 |  SHA1  |
-   |             |   11:33:20   |                  |          |        |
-   | 20000000000 |  2603-10-11  | 0000000027BC86AA | 77737706 | SHA256 |
-   |             |   11:33:20   |                  |          |        |
-   | 20000000000 |  2603-10-11  | 0000000027BC86AA | 47863826 | SHA512 |
-   |             |   11:33:20   |                  |          |        |'''
+    # the RFC 6238 seeds, given as raw bytes keys
+    key_sha1 = b'12345678901234567890'
+    key_sha256 = b'12345678901234567890123456789012'
+    key_sha512 = b'1234567890123456789012345678901234567890123456789012345678901234'
+
+    # RFC 6238 appendix B
+    tv = (
+        Vector(59, '1970-01-01 00:00:59', '0000000000000001', '94287082', 'SHA1'),
+        Vector(59, '1970-01-01 00:00:59', '0000000000000001', '46119246', 'SHA256'),
+        Vector(59, '1970-01-01 00:00:59', '0000000000000001', '90693936', 'SHA512'),
+        Vector(1111111109, '2005-03-18 01:58:29', '00000000023523EC', '07081804', 'SHA1'),
+        Vector(1111111109, '2005-03-18 01:58:29', '00000000023523EC', '68084774', 'SHA256'),
+        Vector(1111111109, '2005-03-18 01:58:29', '00000000023523EC', '25091201', 'SHA512'),
+        Vector(1111111111, '2005-03-18 01:58:31', '00000000023523ED', '14050471', 'SHA1'),
+        Vector(1111111111, '2005-03-18 01:58:31', '00000000023523ED', '67062674', 'SHA256'),
+        Vector(1111111111, '2005-03-18 01:58:31', '00000000023523ED', '99943326', 'SHA512'),
+        Vector(1234567890, '2009-02-13 23:31:30', '000000000273EF07', '89005924', 'SHA1'),
+        Vector(1234567890, '2009-02-13 23:31:30', '000000000273EF07', '91819424', 'SHA256'),
+        Vector(1234567890, '2009-02-13 23:31:30', '000000000273EF07', '93441116', 'SHA512'),
+        Vector(2000000000, '2033-05-18 03:33:20', '0000000003F940AA', '69279037', 'SHA1'),
+        Vector(2000000000, '2033-05-18 03:33:20', '0000000003F940AA', '90698825', 'SHA256'),
+        Vector(2000000000, '2033-05-18 03:33:20', '0000000003F940AA', '38618901', 'SHA512'),
+        Vector(20000000000, '2603-10-11 11:33:20', '0000000027BC86AA', '65353130', 'SHA1'),
+        Vector(20000000000, '2603-10-11 11:33:20', '0000000027BC86AA', '77737706', 'SHA256'),
+        Vector(20000000000, '2603-10-11 11:33:20', '0000000027BC86AA', '47863826', 'SHA512'),
     )
 
     hash_algos = {
@@ -63,9 +49,46 @@ class Totp(unittest.TestCase):
     }
 
     def test_totp(self):
-        for t, _, _, response, algo_key in self.tv:
-            algo = self.hash_algos[algo_key]
-            self.assertTrue(accept_totp(algo['key'], response, t=int(t), hash=algo['alg'], format='dec8'))
+        for vector in self.tv:
+            algo = self.hash_algos[vector.algo]
+            with self.subTest(t=vector.t, algo=vector.algo):
+                self.assertEqual(
+                    accept_totp(algo['key'], vector.response, t=vector.t, hash=algo['alg'], format='dec8'), (True, 0)
+                )
 
     def test_totp_unicode(self):
         accept_totp(u'3133327375706e65726473', u'4e4ba93d', format='hex', period=1800)
+
+    def test_totp_int_response(self):
+        self.assertEqual(accept_totp(self.key_sha1, 94287082, format='dec8', t=59), (True, 0))
+
+    def test_totp_epoch_negative_drift(self):
+        code = totp(self.key_sha1, t=0)
+        self.assertEqual(accept_totp(self.key_sha1, code, t=10, drift=-2), (False, 0))
+        self.assertEqual(accept_totp(self.key_sha1, code, t=40, drift=-1), (True, -1))
+
+    def test_totp_batch(self):
+        codes = totp_batch(self.key_sha1, format='dec8', t=89)
+        self.assertEqual(codes, [totp(self.key_sha1, format='dec8', t=t) for t in (59, 89, 119)])
+        self.assertEqual(codes[0], '94287082')
+
+    def test_totp_time_types(self):
+        for t in (1111111109, 1111111109.5, datetime.datetime(2005, 3, 18, 1, 58, 29)):
+            self.assertEqual(totp(self.key_sha1, format='dec8', t=t), '07081804')
+
+    def test_make_totp(self):
+        totp_sha256 = make_totp(format='dec8', hash=hashlib.sha256)
+        self.assertEqual(totp_sha256(self.key_sha256, t=59), '46119246')
+        self.assertEqual(totp_sha256(self.key_sha256, t=59), totp(self.key_sha256, 'dec8', t=59, hash=hashlib.sha256))
+        with self.assertRaises(ValueError):
+            make_totp(format='dec5')
+
+    def test_totp_epoch(self):
+        self.assertEqual(totp(self.key_sha1, format='dec8', t=0), totp(self.key_sha1, format='dec8', t=29))
+        self.assertNotEqual(totp(self.key_sha1, format='dec8', t=0), totp(self.key_sha1, format='dec8', t=59))
+        self.assertEqual(accept_totp(self.key_sha1, totp(self.key_sha1, t=0), t=0), (True, 0))
+
+    def test_clear_caches(self):
+        accept_totp(self.key_sha1, '94287082', format='dec8', t=59)
+        clear_caches()
+        self.assertEqual(_totp._totp_window.cache_info().currsize, 0)